@@ -6,80 +6,260 @@ Polls the job server and processes requests using local GPU
 Install: pip install gitart-worker
 Usage: gitart-worker --api-key YOUR_API_KEY
 """
+import os
 import json
+import base64
 import time
-import requests
+import random
+import math
 import subprocess
 import argparse
-import hashlib
-import glob
+import tempfile
+import mmap
+import bisect
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
+# requests and hashlib are imported where they're used so --help/--version start fast
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson:
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+else:
+    json_loads = json.loads
+
+    def json_dumps(obj):
+        return json.dumps(obj, separators=(',', ':')).encode()
 
 # Hardcoded configuration - not user configurable
 SERVER_URL = 'https://gitart.me'
 SD_SERVER = 'http://localhost:7860'
 POLL_INTERVAL = 5
+POLL_WAIT = 25  # seconds the server may hold a poll open waiting for a job
+MAX_BACKOFF = 60
+JOB_HARD_TIMEOUT = 600  # wall-clock limit for a whole job, unless the job sets hard_timeout
+HARD_TIMEOUT_ERROR = 'hard timeout'
 
 CONFIG_DIR = Path.home() / ".gitart-worker"
 SETTINGS_FILE = CONFIG_DIR / "settings.json"
+INTEGRITY_CACHE_FILE = CONFIG_DIR / "integrity_cache.json"
 
-# Files to verify integrity
+# Files to verify integrity ('dir/*suffix' entries match files in dir)
 INTEGRITY_PATHS = [
     '/usr/local/bin/sd',
     '/models/sd/*.safetensors',
 ]
 
+# txt2img parameters a job may set, with their defaults; anything else in params is ignored
+SDXL_DEFAULTS = {
+    "prompt": "",
+    "negative_prompt": "",
+    "width": 1024,
+    "height": 1024,
+    "steps": 20,
+    "cfg_scale": 7.0,
+    "seed": -1,
+}
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
 # Models directory
 MODELS_DIR = '/models/sd'
 
+# Block size for reads while hashing, and for the per-chunk hashes
+# used to spot-check cached files
+INTEGRITY_CHUNK_SIZE = 2 << 20
+# Files above this size are hashed straight from an mmap of the page cache
+HASH_MMAP_THRESHOLD = 64 << 20
+
+
+def scan_files(directory, suffix):
+    """List files in directory ending with suffix, like glob('directory/*suffix')"""
+    try:
+        with os.scandir(directory) as it:
+            # DirEntry caches the file type from the directory read, so this
+            # only stats symlinks; hidden files are skipped as glob does
+            return [
+                e for e in it
+                if e.name.endswith(suffix) and not e.name.startswith('.') and e.is_file()
+            ]
+    except OSError:
+        return []
+
 
 def detect_models():
     """Detect available models from the models directory"""
-    models = []
-    for filepath in glob.glob(f"{MODELS_DIR}/*.safetensors"):
-        name = Path(filepath).stem  # filename without extension
-        models.append({"name": name, "service": "sdxl"})
-    return models  # Empty if no models found
+    suffix = '.safetensors'
+    return [
+        {"name": e.name[:-len(suffix)], "service": "sdxl"}
+        for e in scan_files(MODELS_DIR, suffix)
+    ]  # Empty if no models found
+
 
+def compute_file_hashes(filepath):
+    """Compute SHA256 of a file and of each INTEGRITY_CHUNK_SIZE block of it, in one pass"""
+    import hashlib
+    h = hashlib.sha256()
+    chunk_hashes = []
+
+    def add_block(block):
+        h.update(block)
+        chunk_hashes.append(hashlib.sha256(block).hexdigest())
 
-def compute_file_hash(filepath):
-    """Compute SHA256 hash of a file"""
     try:
-        h = hashlib.sha256()
-        with open(filepath, 'rb') as f:
-            for chunk in iter(lambda: f.read(8192), b''):
-                h.update(chunk)
-        return h.hexdigest()
+        with open(filepath, 'rb', buffering=0) as f:
+            if os.fstat(f.fileno()).st_size > HASH_MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                        mm.madvise(mmap.MADV_SEQUENTIAL)
+                    with memoryview(mm) as view:
+                        for offset in range(0, len(mm), INTEGRITY_CHUNK_SIZE):
+                            with view[offset:offset + INTEGRITY_CHUNK_SIZE] as block:
+                                add_block(block)
+                return h.hexdigest(), chunk_hashes
+
+            # Reuse one buffer instead of allocating bytes per read
+            buf = bytearray(INTEGRITY_CHUNK_SIZE)
+            view = memoryview(buf)
+            while True:
+                # Fill the whole block so chunk boundaries line up with chunks_match
+                n = 0
+                while n < len(buf):
+                    got = f.readinto(view[n:])
+                    if not got:
+                        break
+                    n += got
+                if not n:
+                    break
+                add_block(view[:n])
+                if n < len(buf):
+                    break
+            return h.hexdigest(), chunk_hashes
     except (IOError, OSError):
-        return None
+        return None, None
+
+
+def chunks_match(filepath, size, chunk_hashes):
+    """Spot-check the first, last and one random chunk against cached chunk hashes"""
+    import hashlib
+    count = -(-size // INTEGRITY_CHUNK_SIZE)
+    if not isinstance(chunk_hashes, list) or len(chunk_hashes) != count:
+        return False
+    if not count:
+        return True
+    try:
+        with open(filepath, 'rb', buffering=0) as f:
+            for i in {0, count - 1, random.randrange(count)}:
+                data = os.pread(f.fileno(), INTEGRITY_CHUNK_SIZE, i * INTEGRITY_CHUNK_SIZE)
+                if hashlib.sha256(data).hexdigest() != chunk_hashes[i]:
+                    return False
+    except (IOError, OSError):
+        return False
+    return True
+
+
+def write_json_atomic(path, data):
+    """Write JSON via a sibling temp file and rename, so readers never see a partial file"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.stem}.', suffix='.json.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def load_integrity_cache():
+    """Load cached hashes keyed by path, with the size/mtime they were computed at"""
+    try:
+        with open(INTEGRITY_CACHE_FILE, 'r') as f:
+            cache = json.load(f)
+        if isinstance(cache, dict):
+            return cache
+    except (json.JSONDecodeError, IOError, OSError):
+        pass
+    return {}
+
+
+def save_integrity_cache(cache):
+    try:
+        write_json_atomic(INTEGRITY_CACHE_FILE, cache)
+    except (IOError, OSError):
+        pass
+
+
+def cached_file_hash(filepath, cache):
+    """Return (hash, cache entry), reusing the cached hash if size, mtime and chunks match"""
+    try:
+        st = os.stat(filepath)
+    except OSError:
+        return None, None
+
+    size, mtime = st.st_size, int(st.st_mtime)
+    entry = cache.get(str(filepath))
+    # Anything but a well-formed entry (hand edits, old formats) is just a miss
+    if (isinstance(entry, dict) and entry.get('size') == size and entry.get('mtime') == mtime
+            and entry.get('sha256')
+            and chunks_match(filepath, size, entry.get('chunk_hashes'))):
+        return entry['sha256'], entry
+
+    h, chunk_hashes = compute_file_hashes(filepath)
+    if not h:
+        return None, None
+    return h, {'size': size, 'mtime': mtime, 'sha256': h, 'chunk_hashes': chunk_hashes}
 
 
 def compute_integrity_hashes():
     """Compute hashes of all critical files"""
-    hashes = {}
+    targets = []  # (key, filepath)
 
     for pattern in INTEGRITY_PATHS:
         if '*' in pattern:
-            for filepath in glob.glob(pattern):
-                h = compute_file_hash(filepath)
-                if h:
-                    hashes[filepath] = h
+            directory, suffix = pattern.split('/*', 1)
+            targets.extend((e.path, e.path) for e in scan_files(directory, suffix))
         else:
-            h = compute_file_hash(pattern)
-            if h:
-                hashes[pattern] = h
+            targets.append((pattern, pattern))
 
     # Hash this script itself
-    h = compute_file_hash(Path(__file__).resolve())
-    if h:
-        hashes['worker_script'] = h
+    targets.append(('worker_script', Path(__file__).resolve()))
+
+    cache = load_integrity_cache()
+
+    # hashlib releases the GIL, so threads overlap both disk reads and hashing
+    workers = min(8, os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(
+            lambda fp: cached_file_hash(fp, cache), [fp for _, fp in targets]
+        ))
+
+    hashes = {}
+    new_cache = {}
+    for (key, filepath), (h, entry) in zip(targets, results):
+        if h:
+            hashes[key] = h
+            new_cache[str(filepath)] = entry
+
+    if new_cache != cache:
+        save_integrity_cache(new_cache)
 
     return hashes
 
 
 def log(msg):
-    print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}", flush=True)
+    t = time.localtime()
+    print(f"[{t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}] {msg}", flush=True)
 
 
 def load_settings():
@@ -93,32 +273,125 @@ def load_settings():
 
 
 def save_settings(settings):
-    CONFIG_DIR.mkdir(parents=True, exist_ok=True)
-    with open(SETTINGS_FILE, 'w') as f:
-        json.dump(settings, f, indent=2)
+    write_json_atomic(SETTINGS_FILE, settings)
+
 
+def parse_minutes(hhmm):
+    hours, minutes = hhmm.split(':')
+    return int(hours) * 60 + int(minutes)
 
-def is_within_schedule(schedule):
+
+def compile_schedule(schedule):
+    """Precompute a schedule as (tz, {day: (starts, ends)}) in minutes; None = always active"""
     if not schedule or not schedule.get('enabled'):
-        return True
+        return None
     try:
         from zoneinfo import ZoneInfo
         tz = ZoneInfo(schedule.get('timezone', 'UTC'))
-    except (ImportError, KeyError):
+    except (ImportError, KeyError, ValueError, TypeError):
+        # Unknown, malformed ('', '../etc') or non-string timezones
+        return None
+
+    spans = {}
+    for rule in schedule.get('rules', []):
+        try:
+            lo = parse_minutes(rule.get('start_time', '00:00'))
+            hi = parse_minutes(rule.get('end_time', '23:59'))
+        except (ValueError, AttributeError):
+            continue
+        if lo > hi:
+            continue
+        for day in rule.get('days', []):
+            spans.setdefault(day, []).append((lo, hi))
+
+    # Merge overlapping intervals so a bisect on start times finds the only candidate
+    by_day = {}
+    for day, day_spans in spans.items():
+        merged = []
+        for lo, hi in sorted(day_spans):
+            if merged and lo <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], hi)
+            else:
+                merged.append([lo, hi])
+        by_day[day] = ([lo for lo, _ in merged], [hi for _, hi in merged])
+    return tz, by_day
+
+
+def is_within_schedule(compiled):
+    if compiled is None:
         return True
+    tz, by_day = compiled
 
     now = datetime.now(tz)
-    current_day = now.strftime('%a').lower()[:3]
-    current_time = now.strftime('%H:%M')
+    intervals = by_day.get(WEEKDAYS[now.weekday()])
+    if not intervals:
+        return False
+    starts, ends = intervals
+    minute = now.hour * 60 + now.minute
+    i = bisect.bisect_right(starts, minute) - 1
+    return i >= 0 and minute <= ends[i]
+
+
+def gpu_entry(idx, name, vram):
+    """Build a GPU record from its index, name and VRAM in MiB, or None to skip it"""
+    if any(k in name.lower() for k in ['llvmpipe', 'software', 'virtual']):
+        return None
+    if vram < 2000:
+        return None
+    return {
+        'index': idx,
+        'name': name,
+        'memory': f"{vram // 1024}GB" if vram >= 1024 else f"{vram}MB"
+    }
 
-    for rule in schedule.get('rules', []):
-        if current_day in rule.get('days', []):
-            if rule.get('start_time', '00:00') <= current_time <= rule.get('end_time', '23:59'):
-                return True
-    return False
 
+def detect_gpus_nvml():
+    """Query GPUs by calling libnvidia-ml directly; returns None if NVML is unavailable"""
+    import ctypes
 
-def detect_gpus():
+    class NvmlMemory(ctypes.Structure):
+        _fields_ = [
+            ('total', ctypes.c_ulonglong),
+            ('free', ctypes.c_ulonglong),
+            ('used', ctypes.c_ulonglong),
+        ]
+
+    try:
+        nvml = ctypes.CDLL('libnvidia-ml.so.1')
+        nvml.nvmlDeviceGetHandleByIndex_v2.argtypes = [
+            ctypes.c_uint, ctypes.POINTER(ctypes.c_void_p)
+        ]
+        nvml.nvmlDeviceGetName.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_uint]
+        nvml.nvmlDeviceGetMemoryInfo.argtypes = [ctypes.c_void_p, ctypes.POINTER(NvmlMemory)]
+    except (OSError, AttributeError):  # library missing, or a driver too old for the _v2 API
+        return None
+
+    # Every NVML call returns 0 (NVML_SUCCESS) or an error code
+    if nvml.nvmlInit_v2() != 0:
+        return None
+    try:
+        count = ctypes.c_uint()
+        if nvml.nvmlDeviceGetCount_v2(ctypes.byref(count)) != 0:
+            return None
+        gpus = []
+        for idx in range(count.value):
+            handle = ctypes.c_void_p()
+            name = ctypes.create_string_buffer(96)
+            mem = NvmlMemory()
+            if (nvml.nvmlDeviceGetHandleByIndex_v2(idx, ctypes.byref(handle)) != 0
+                    or nvml.nvmlDeviceGetName(handle, name, len(name)) != 0
+                    or nvml.nvmlDeviceGetMemoryInfo(handle, ctypes.byref(mem)) != 0):
+                return None
+            name = name.value.decode(errors='replace')
+            gpu = gpu_entry(idx, name, mem.total // (1024 * 1024))
+            if gpu:
+                gpus.append(gpu)
+        return gpus
+    finally:
+        nvml.nvmlShutdown()
+
+
+def detect_gpus_smi():
     gpus = []
     try:
         result = subprocess.run(
@@ -132,22 +405,10 @@ def detect_gpus():
             parts = [p.strip() for p in line.split(',')]
             if len(parts) >= 3:
                 try:
-                    idx = int(parts[0])
-                    name = parts[1]
-                    mem = parts[2]
-
-                    if any(k in name.lower() for k in ['llvmpipe', 'software', 'virtual']):
-                        continue
-
-                    vram = int(mem.replace('MiB', '').strip())
-                    if vram < 2000:
-                        continue
-
-                    gpus.append({
-                        'index': idx,
-                        'name': name,
-                        'memory': f"{vram // 1024}GB" if vram >= 1024 else f"{vram}MB"
-                    })
+                    vram = int(parts[2].replace('MiB', '').strip())
+                    gpu = gpu_entry(int(parts[0]), parts[1], vram)
+                    if gpu:
+                        gpus.append(gpu)
                 except (ValueError, IndexError):
                     continue
     except (subprocess.SubprocessError, FileNotFoundError, OSError):
@@ -155,35 +416,71 @@ def detect_gpus():
     return gpus
 
 
-def run_sdxl(params):
+def detect_gpus():
+    # NVML avoids forking nvidia-smi; fall back to it when NVML isn't usable
+    gpus = detect_gpus_nvml()
+    if gpus is None:
+        gpus = detect_gpus_smi()
+    return gpus
+
+
+def create_session(headers=None):
+    """Create an HTTP session that keeps connections alive and retries gateway errors"""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    # Retry connect failures and gateway errors only. A read timeout on a
+    # long poll already took POLL_WAIT + 10s, and worker_loop backs off itself.
+    retry = Retry(
+        total=3, read=False, backoff_factor=0.5,
+        status_forcelist=(502, 503, 504), raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def post_json(session, url, payload, **kwargs):
+    """POST payload as JSON, serialized with orjson when it's installed"""
+    return session.post(
+        url, data=json_dumps(payload), headers={'Content-Type': 'application/json'}, **kwargs
+    )
+
+
+def run_sdxl(params, session):
     try:
-        resp = requests.post(f"{SD_SERVER}/txt2img", json={
-            "prompt": params.get('prompt', ''),
-            "negative_prompt": params.get('negative_prompt', ''),
-            "width": params.get('width', 1024),
-            "height": params.get('height', 1024),
-            "steps": params.get('steps', 20),
-            "cfg_scale": params.get('cfg_scale', 7.0),
-            "seed": params.get('seed', -1),
-            "sample_method": "euler_a"
-        }, timeout=300)
+        body = {**SDXL_DEFAULTS, **{k: v for k, v in params.items() if k in SDXL_DEFAULTS}}
+        body["sample_method"] = "euler_a"
+        resp = post_json(session, f"{SD_SERVER}/txt2img", body, timeout=300)
 
         if resp.status_code != 200:
             return {'error': f'Server error {resp.status_code}'}
 
-        r = resp.json()
+        r = json_loads(resp.content)
+        del resp  # drop the raw body so only one copy of the image is alive
         if 'images' in r and r['images']:
-            return {'image': r['images'][0], 'seed': r.get('seed', -1)}
+            b64 = r['images'][0]
         elif 'image' in r:
-            return {'image': r['image'], 'seed': r.get('seed', -1)}
-        return {'error': 'No image'}
+            b64 = r['image']
+        else:
+            return {'error': 'No image'}
+        seed = r.get('seed', -1)
+        del r
+        return {'image': base64.b64decode(b64), 'seed': seed}
     except Exception as e:
         return {'error': str(e)}
 
 
-def process_job(job):
+def process_job(job, sd_session):
+    import requests
+
     service = job.get('service', 'sdxl')
-    params = job.get('params', {})
+    params = job.get('params') or {}
 
     log(f"Processing {service} job {job['id'][:8]}...")
     start = time.time()
@@ -191,7 +488,35 @@ def process_job(job):
     if service != 'sdxl':
         return {'error': f'Unsupported service: {service}'}
 
-    result = run_sdxl(params)
+    try:
+        hard_timeout = float(params.get('hard_timeout', JOB_HARD_TIMEOUT))
+    except (AttributeError, TypeError, ValueError, OverflowError):
+        hard_timeout = JOB_HARD_TIMEOUT
+    if not (hard_timeout > 0 and math.isfinite(hard_timeout)):
+        hard_timeout = JOB_HARD_TIMEOUT
+    # Thread.join() overflows on values past TIMEOUT_MAX, after the render has started
+    hard_timeout = min(hard_timeout, threading.TIMEOUT_MAX)
+
+    # run_sdxl only bounds each request; also cap the job as a whole so a
+    # hung SD server can't pin this executor forever. It runs on a daemon
+    # thread so an abandoned request doesn't block interpreter exit.
+    outcome = {}
+    thread = threading.Thread(
+        target=lambda: outcome.update(result=run_sdxl(params, sd_session)), daemon=True
+    )
+    thread.start()
+    thread.join(hard_timeout)
+    if thread.is_alive():
+        try:
+            sd_session.post(f"{SD_SERVER}/interrupt", timeout=10)
+        except requests.RequestException:
+            pass
+        # The abandoned request still owns a connection in this session;
+        # the caller must replace it before the next job
+        sd_session.close()
+        result = {'error': HARD_TIMEOUT_ERROR}
+    else:
+        result = outcome['result']
     elapsed = time.time() - start
 
     if 'error' in result:
@@ -203,7 +528,50 @@ def process_job(job):
     return {'result': result}
 
 
-def worker_loop(api_key):
+def complete_job(session, job_id, result):
+    """Report a job result, uploading the image as raw PNG bytes"""
+    url = f"{SERVER_URL}/worker/jobs/{job_id}/complete"
+    job_result = result.get('result')
+    if job_result and 'image' in job_result:
+        session.post(url, files={'image': ('out.png', job_result['image'], 'image/png')}, data={
+            'seed': job_result['seed'],
+            'inference_time': job_result['inference_time'],
+        }, timeout=30)
+    else:
+        post_json(session, url, result, timeout=30)
+
+
+def backoff_delay(errors, base=POLL_INTERVAL):
+    """Capped exponential backoff with jitter, so workers don't reconnect in lockstep"""
+    return min(MAX_BACKOFF, base * (2 ** min(errors, 6))) * (0.5 + random.random())
+
+
+def job_executor(job_queue, slots, headers):
+    """Run queued jobs and report results, freeing a slot after each one"""
+    session = create_session(headers)
+    sd_session = create_session()
+    while True:
+        job = job_queue.get()
+        try:
+            try:
+                result = process_job(job, sd_session)
+                if result.get('error') == HARD_TIMEOUT_ERROR:
+                    # process_job closed the session its stuck request is using
+                    sd_session = create_session()
+            except Exception as e:
+                # Still report the failure so the job doesn't hang server-side
+                log(f"Job failed: {e}")
+                result = {'error': str(e)}
+            complete_job(session, job['id'], result)
+        except Exception as e:
+            log(f"Error: {e}")
+        finally:
+            slots.release()
+
+
+def worker_loop(api_key, concurrency=1):
+    import requests
+
     gpus = detect_gpus()
     if gpus:
         log(f"Detected {len(gpus)} GPU(s)")
@@ -225,42 +593,78 @@ def worker_loop(api_key):
 
     settings = load_settings()
     settings_version = settings.get('settings_version', 0) if settings else 0
+    schedule = compile_schedule(settings.get('schedule') if settings else None)
 
+    # Built once and set on each session; compact JSON since these go out with every request
+    compact = (',', ':')
     headers = {
         'Authorization': f'Bearer {api_key}',
-        'X-Worker-Models': json.dumps(models),
-        'X-Worker-GPU': json.dumps(gpu_info),
-        'X-Worker-GPUs': json.dumps(gpus),
-        'X-Worker-Integrity': json.dumps(integrity_hashes)
+        'X-Worker-Models': json.dumps(models, separators=compact),
+        'X-Worker-GPU': json.dumps(gpu_info, separators=compact),
+        'X-Worker-GPUs': json.dumps(gpus, separators=compact),
+        'X-Worker-Integrity': json.dumps(integrity_hashes, separators=compact)
     }
 
+    session = create_session(headers)
+
+    # Executors take jobs off the queue; a slot is held for each job in flight
+    job_queue = queue.Queue()
+    slots = threading.Semaphore(concurrency)
+    for _ in range(concurrency):
+        threading.Thread(
+            target=job_executor, args=(job_queue, slots, headers), daemon=True
+        ).start()
+
     log(f"Starting worker, connecting to {SERVER_URL}")
     log("Press Ctrl+C to stop")
 
     errors = 0
+    delay = 0
+    slot_held = False
     while True:
         try:
-            if settings and not is_within_schedule(settings.get('schedule', {})):
+            # Back off inside the try so Ctrl+C during the wait shuts down cleanly
+            if delay:
+                time.sleep(delay)
+                delay = 0
+
+            if not is_within_schedule(schedule):
                 time.sleep(POLL_INTERVAL)
                 continue
 
-            resp = requests.get(f"{SERVER_URL}/worker/jobs/poll", headers=headers, timeout=30)
-
-            if resp.status_code == 401:
-                log("ERROR: Invalid API key")
+            # Only ask for a job when an executor is free to run it
+            if not slot_held:
+                slots.acquire()
+                slot_held = True
+
+            poll_start = time.monotonic()
+            resp = session.get(
+                f"{SERVER_URL}/worker/jobs/poll", params={'wait': POLL_WAIT},
+                timeout=POLL_WAIT + 10
+            )
+
+            if resp.status_code in (401, 403):
+                if resp.status_code == 401:
+                    log("ERROR: Invalid API key")
+                else:
+                    log("ERROR: Worker rejected by server (403)")
+                # Let jobs already handed to executors finish and report first
+                for _ in range(concurrency - slot_held):
+                    slots.acquire()
                 return
-            if resp.status_code != 200:
+            if resp.status_code not in (200, 204):
                 errors += 1
-                time.sleep(min(POLL_INTERVAL * errors, 60))
+                delay = backoff_delay(errors)
                 continue
 
-            data = resp.json()
+            data = json_loads(resp.content) if resp.status_code != 204 and resp.content else {}
 
             # Sync settings
             if data.get('config_sync'):
                 new_ver = data['config_sync'].get('settings_version', 0)
                 if new_ver > settings_version:
                     settings = data['config_sync'].get('settings')
+                    schedule = compile_schedule(settings.get('schedule') if settings else None)
                     if settings:
                         save_settings(settings)
                         settings_version = new_ver
@@ -269,30 +673,40 @@ def worker_loop(api_key):
             job = data.get('job')
             if job:
                 errors = 0
-                result = process_job(job)
-                requests.post(
-                    f"{SERVER_URL}/worker/jobs/{job['id']}/complete",
-                    headers=headers, json=result, timeout=30
-                )
+                job_queue.put(job)
+                slot_held = False
             else:
                 errors = 0
-                time.sleep(POLL_INTERVAL)
+                # Long-poll returns as soon as a job is ready; only throttle
+                # if the server answered immediately without holding the request
+                remaining = POLL_INTERVAL - (time.monotonic() - poll_start)
+                if remaining > 0:
+                    time.sleep(remaining)
 
         except KeyboardInterrupt:
             log("Shutting down...")
             break
+        except (requests.ConnectionError, requests.Timeout) as e:
+            # Network blips usually clear quickly; retry sooner than for server errors
+            log(f"Connection error: {e}")
+            errors += 1
+            delay = backoff_delay(errors, base=1)
         except Exception as e:
             log(f"Error: {e}")
             errors += 1
-            time.sleep(min(POLL_INTERVAL * errors, 60))
+            delay = backoff_delay(errors)
 
 
 def main():
     parser = argparse.ArgumentParser(description='Gitart Worker - SDXL Inference')
     parser.add_argument('--api-key', required=True, help='Your API key')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='Number of jobs to run at once (default: 1)')
     parser.add_argument('--version', action='version', version='0.1.0')
     args = parser.parse_args()
-    worker_loop(args.api_key)
+    if args.concurrency < 1:
+        parser.error('--concurrency must be at least 1')
+    worker_loop(args.api_key, args.concurrency)
 
 
 if __name__ == '__main__':